@@ -17,14 +17,54 @@ API Endpoints:
 - /api/* - Various API endpoints for HTMX interactions
 """
 from flask import Flask, render_template, request, jsonify, Response
-from datetime import datetime
+from flask.json.provider import DefaultJSONProvider
+from functools import cache, lru_cache
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import escape
+import os
+import random
+import re
+import threading
 import time
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    _json_bytes = orjson.dumps
+
+    class _OrjsonProvider(DefaultJSONProvider):
+        """Parse request bodies with orjson; responses keep Flask's encoder"""
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+else:
+    def _json_bytes(obj):
+        return json.dumps(obj).encode()
+
+
 app = Flask(__name__)
 # SECURITY: Change this secret key in production - use environment variables
 app.config['SECRET_KEY'] = 'dev-secret-key-change-in-production'
 
+# Keep compiled templates on disk so fresh workers skip parsing them, and make
+# room in the in-memory cache for every page and partial
+app.jinja_options = {
+    **app.jinja_options,
+    'bytecode_cache': FileSystemBytecodeCache(),
+    'cache_size': 400,
+}
+
+if orjson is not None:
+    app.json = _OrjsonProvider(app)
+
+# Artificial delays that make the demo's loading indicators visible; opt-in
+# with SIMULATE_LATENCY=1 (the dev server below turns them on by default)
+_SIMULATE_LATENCY = os.environ.get('SIMULATE_LATENCY') == '1'
+
 # In-memory data store for demo purposes
 tasks = [
     {"id": 1, "title": "Learn HTMX", "completed": False, "priority": "high"},
@@ -32,18 +72,84 @@ tasks = [
     {"id": 3, "title": "Deploy to Production", "completed": False, "priority": "low"},
 ]
 
+# Index of tasks by id so single-task routes don't scan the list
+tasks_by_id = {t['id']: t for t in tasks}
+
+# Guards writes to `tasks`, `tasks_by_id` and `next_task_id` under threaded
+# workers; reads stay lock-free
+_tasks_lock = threading.Lock()
+
 users = [
     {"id": i, "name": f"User {i}", "email": f"user{i}@example.com"} 
     for i in range(1, 51)
 ]
 
+# Lowercased search columns, parallel to `users`
+_user_names_lc = [u['name'].lower() for u in users]
+_user_emails_lc = [u['email'].lower() for u in users]
+
 next_task_id = 4
 
+# Simulated database of usernames that are already registered
+_TAKEN_USERNAMES = frozenset(('admin', 'user', 'test'))
+
+_EMAIL_RE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+# Empty bodies are shared Response objects; they must never be mutated
+_EMPTY_200 = Response(b'', status=200, mimetype='text/html')
+_EMPTY_204 = Response(b'', status=204, mimetype='text/html')
+
+
+# Zero-padded 00-61 (tm_sec allows leap seconds), indexed instead of strftime
+_TWO_DIGITS = [f'{i:02d}' for i in range(62)]
+_hhmmss_second = None
+_hhmmss_value = ''
+
+
+def _hhmmss():
+    """Current local time as HH:MM:SS, formatted at most once per second"""
+    global _hhmmss_second, _hhmmss_value
+    now = int(time.time())
+    if now != _hhmmss_second:
+        local = time.localtime(now)
+        _hhmmss_value = ':'.join((_TWO_DIGITS[local.tm_hour],
+                                  _TWO_DIGITS[local.tm_min],
+                                  _TWO_DIGITS[local.tm_sec]))
+        _hhmmss_second = now
+    return _hhmmss_value
+
+
+@cache
+def _cached_tpl(name):
+    return app.jinja_env.get_template(name)
+
+
+def _tpl(name):
+    """Compiled template lookup for partials rendered by the API endpoints"""
+    # Go through Jinja in debug mode so its up-to-date check picks up edits
+    if app.debug:
+        return app.jinja_env.get_template(name)
+    return _cached_tpl(name)
+
+
+_static_pages = {}
+
+
+def _static_page(name):
+    """Full page without per-request state, rendered on first hit and reused"""
+    page = _static_pages.get(name)
+    if page is None:
+        page = render_template(name).encode()
+        # Re-render every time in debug mode so template edits show up
+        if not app.debug:
+            _static_pages[name] = page
+    return page
+
 
 @app.route('/')
 def index():
     """Main page with navigation to all HTMX demos"""
-    return render_template('index.html')
+    return _static_page('index.html')
 
 
 # =============================================================================
@@ -53,27 +159,35 @@ def index():
 @app.route('/basic')
 def basic():
     """Basic HTMX requests demo"""
-    return render_template('basic.html')
+    return _static_page('basic.html')
+
+
+_GREET_FMT = '<div class="alert alert-success">Hello, {}!</div>'
+_TIME_FMT = '<span class="badge badge-info">{}</span>'
 
 
 @app.route('/api/greet', methods=['GET'])
 def greet():
     """Simple GET request"""
     name = request.args.get('name', 'World')
-    return f'<div class="alert alert-success">Hello, {name}!</div>'
+    return _GREET_FMT.format(escape(name))
 
 
 @app.route('/api/time', methods=['GET'])
 def get_time():
     """Get current server time"""
-    current_time = datetime.now().strftime('%H:%M:%S')
-    return f'<span class="badge badge-info">{current_time}</span>'
+    current_time = _hhmmss()
+    return _TIME_FMT.format(current_time)
 
 
 # =============================================================================
 # TASK MANAGEMENT (CRUD OPERATIONS)
 # =============================================================================
 
+_TASK_NOT_FOUND = (b'<div class="alert alert-error">Task not found</div>', 404)
+_TASK_TITLE_REQUIRED = (b'<div class="alert alert-error">Task title is required</div>', 400)
+
+
 @app.route('/tasks')
 def tasks_page():
     """Task management demo"""
@@ -86,99 +200,108 @@ def get_tasks():
     filter_status = request.args.get('status', 'all')
     filtered_tasks = tasks
     
+    # task_list.html iterates once, so a generator is enough
     if filter_status == 'completed':
-        filtered_tasks = [t for t in tasks if t['completed']]
+        filtered_tasks = (t for t in tasks if t['completed'])
     elif filter_status == 'active':
-        filtered_tasks = [t for t in tasks if not t['completed']]
+        filtered_tasks = (t for t in tasks if not t['completed'])
     
-    return render_template('partials/task_list.html', tasks=filtered_tasks)
+    return _tpl('partials/task_list.html').render(tasks=filtered_tasks)
 
 
 @app.route('/api/tasks', methods=['POST'])
 def create_task():
     """Create a new task"""
     global next_task_id
-    title = request.form.get('title')
-    priority = request.form.get('priority', 'medium')
+    form = request.form
+    title = form.get('title')
+    priority = form.get('priority', 'medium')
     
     if not title:
-        return '<div class="alert alert-error">Task title is required</div>', 400
+        return _TASK_TITLE_REQUIRED
     
-    new_task = {
-        "id": next_task_id,
-        "title": title,
-        "completed": False,
-        "priority": priority
-    }
-    tasks.append(new_task)
-    next_task_id += 1
+    with _tasks_lock:
+        new_task = {
+            "id": next_task_id,
+            "title": title,
+            "completed": False,
+            "priority": priority
+        }
+        tasks.append(new_task)
+        tasks_by_id[new_task['id']] = new_task
+        next_task_id += 1
     
-    return render_template('partials/task_item.html', task=new_task)
+    return _tpl('partials/task_item.html').render(task=new_task)
 
 
 @app.route('/api/tasks/<int:task_id>', methods=['GET'])
 def get_task(task_id):
     """Get a single task"""
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = tasks_by_id.get(task_id)
     if not task:
-        return '<div class="alert alert-error">Task not found</div>', 404
-    return render_template('partials/task_item.html', task=task)
+        return _TASK_NOT_FOUND
+    return _tpl('partials/task_item.html').render(task=task)
 
 
 @app.route('/api/tasks/<int:task_id>/toggle', methods=['PUT', 'POST'])
 def toggle_task(task_id):
     """Toggle task completion status"""
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = tasks_by_id.get(task_id)
     if not task:
-        return '<div class="alert alert-error">Task not found</div>', 404
+        return _TASK_NOT_FOUND
     
-    task['completed'] = not task['completed']
-    return render_template('partials/task_item.html', task=task)
+    with _tasks_lock:
+        task['completed'] = not task['completed']
+    return _tpl('partials/task_item.html').render(task=task)
 
 
 @app.route('/api/tasks/<int:task_id>/edit', methods=['GET'])
 def edit_task_form(task_id):
     """Get edit form for a task"""
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = tasks_by_id.get(task_id)
     if not task:
-        return '<div class="alert alert-error">Task not found</div>', 404
-    return render_template('partials/task_edit.html', task=task)
+        return _TASK_NOT_FOUND
+    return _tpl('partials/task_edit.html').render(task=task)
 
 
 @app.route('/api/tasks/<int:task_id>', methods=['PUT', 'POST'])
 def update_task(task_id):
     """Update a task"""
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = tasks_by_id.get(task_id)
     if not task:
-        return '<div class="alert alert-error">Task not found</div>', 404
+        return _TASK_NOT_FOUND
     
-    title = request.form.get('title')
-    priority = request.form.get('priority')
+    form = request.form
+    title = form.get('title')
+    priority = form.get('priority')
     
     if not title:
-        return '<div class="alert alert-error">Task title is required</div>', 400
+        return _TASK_TITLE_REQUIRED
     
-    task['title'] = title
-    task['priority'] = priority
+    with _tasks_lock:
+        task['title'] = title
+        task['priority'] = priority
     
-    return render_template('partials/task_item.html', task=task)
+    return _tpl('partials/task_item.html').render(task=task)
 
 
 @app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """Delete a task"""
-    global tasks
-    tasks = [t for t in tasks if t['id'] != task_id]
-    return '', 200
+    with _tasks_lock:
+        task = tasks_by_id.pop(task_id, None)
+        if task:
+            tasks.remove(task)
+    return _EMPTY_200
 
 
 @app.route('/api/tasks/<int:task_id>/delete-confirm', methods=['GET'])
 def delete_task_confirm(task_id):
     """Show delete confirmation"""
-    task = next((t for t in tasks if t['id'] == task_id), None)
+    task = tasks_by_id.get(task_id)
     if not task:
-        return '<div class="alert alert-error">Task not found</div>', 404
-    return render_template('partials/task_delete_confirm.html', task=task)
+        return _TASK_NOT_FOUND
+    return _tpl('partials/task_delete_confirm.html').render(task=task)
 
 
 # =============================================================================
@@ -188,7 +311,7 @@ def delete_task_confirm(task_id):
 @app.route('/search')
 def search_page():
     """Search and infinite scroll demo"""
-    return render_template('search.html')
+    return _static_page('search.html')
 
 
 @app.route('/api/search', methods=['GET'])
@@ -197,32 +320,47 @@ def search_users():
     query = request.args.get('q', '').lower()
     
     # Simulate processing time
-    time.sleep(0.3)
+    if _SIMULATE_LATENCY:
+        time.sleep(0.3)
     
-    filtered_users = [u for u in users if query in u['name'].lower() or query in u['email'].lower()]
+    if query:
+        filtered_users = [users[i] for i, (name, email) in enumerate(zip(_user_names_lc, _user_emails_lc))
+                          if query in name or query in email]
+    else:
+        filtered_users = users
     
-    return render_template('partials/user_list.html', users=filtered_users, query=query)
+    return _tpl('partials/user_list.html').render(users=filtered_users, query=query)
+
+
+def _render_infinite_page(page, per_page=10):
+    """Rendered infinite scroll page"""
+    start = (page - 1) * per_page
+    end = start + per_page
+    page_users = users[start:end]
+    
+    has_more = end < len(users)
+    
+    return _tpl('partials/user_infinite.html').render(users=page_users,
+                                                      page=page + 1,
+                                                      has_more=has_more)
+
+
+# `users` never changes, so rendered pages can be reused outside debug mode
+_infinite_page_html = lru_cache(maxsize=32)(_render_infinite_page)
 
 
 @app.route('/api/users/infinite', methods=['GET'])
 def infinite_scroll_users():
     """Infinite scroll pagination"""
     page = int(request.args.get('page', 1))
-    per_page = 10
     
     # Simulate loading time
-    time.sleep(0.5)
-    
-    start = (page - 1) * per_page
-    end = start + per_page
-    page_users = users[start:end]
-    
-    has_more = end < len(users)
+    if _SIMULATE_LATENCY:
+        time.sleep(0.5)
     
-    return render_template('partials/user_infinite.html', 
-                         users=page_users, 
-                         page=page + 1, 
-                         has_more=has_more)
+    if app.debug:
+        return _render_infinite_page(page)
+    return _infinite_page_html(page)
 
 
 # =============================================================================
@@ -232,7 +370,7 @@ def infinite_scroll_users():
 @app.route('/forms')
 def forms_page():
     """Forms and validation demo"""
-    return render_template('forms.html')
+    return _static_page('forms.html')
 
 
 @app.route('/api/validate-email', methods=['POST'])
@@ -243,7 +381,7 @@ def validate_email():
     if not email:
         return '<div class="error-message">Email is required</div>', 400
     
-    if '@' not in email or '.' not in email.split('@')[-1]:
+    if not _EMAIL_RE.fullmatch(email):
         return '<div class="error-message">Please enter a valid email address</div>', 400
     
     return '<div class="success-message">✓ Email looks good!</div>', 200
@@ -261,23 +399,13 @@ def validate_username():
         return '<div class="error-message">Username must be at least 3 characters</div>', 400
     
     # Simulate checking database
-    taken_usernames = ['admin', 'user', 'test']
-    if username.lower() in taken_usernames:
+    if username.lower() in _TAKEN_USERNAMES:
         return '<div class="error-message">Username is already taken</div>', 400
     
     return '<div class="success-message">✓ Username is available!</div>', 200
 
 
-@app.route('/api/submit-form', methods=['POST'])
-def submit_form():
-    """Submit the complete form"""
-    username = request.form.get('username', '')
-    email = request.form.get('email', '')
-    
-    # Simulate processing
-    time.sleep(1)
-    
-    return f'''
+_REGISTRATION_FMT = '''
     <div class="alert alert-success">
         <h3>Registration Successful!</h3>
         <p>Welcome, {username}!</p>
@@ -286,6 +414,20 @@ def submit_form():
     '''
 
 
+@app.route('/api/submit-form', methods=['POST'])
+def submit_form():
+    """Submit the complete form"""
+    form = request.form
+    username = form.get('username', '')
+    email = form.get('email', '')
+    
+    # Simulate processing
+    if _SIMULATE_LATENCY:
+        time.sleep(1)
+    
+    return _REGISTRATION_FMT.format(username=escape(username), email=escape(email))
+
+
 # =============================================================================
 # POLLING AND AUTO-REFRESH
 # =============================================================================
@@ -293,49 +435,50 @@ def submit_form():
 @app.route('/polling')
 def polling_page():
     """Polling and auto-refresh demo"""
-    return render_template('polling.html')
+    return _static_page('polling.html')
 
 
 @app.route('/api/server-status', methods=['GET'])
 def server_status():
     """Get server status (simulated)"""
-    import random
-    
     cpu = random.randint(10, 90)
     memory = random.randint(30, 85)
     disk = random.randint(40, 70)
     
-    return render_template('partials/server_status.html', 
-                         cpu=cpu, 
-                         memory=memory, 
-                         disk=disk,
-                         timestamp=datetime.now().strftime('%H:%M:%S'))
+    return _tpl('partials/server_status.html').render(cpu=cpu,
+                                                      memory=memory,
+                                                      disk=disk,
+                                                      timestamp=_hhmmss())
 
 
-@app.route('/api/notifications', methods=['GET'])
-def notifications():
-    """Get new notifications"""
-    import random
-    
-    notification_types = [
-        ("info", "New user registered"),
-        ("success", "Backup completed successfully"),
-        ("warning", "High memory usage detected"),
-        ("error", "Failed login attempt")
-    ]
-    
-    # Randomly decide if there's a new notification
-    if random.random() > 0.5:
-        notif_type, message = random.choice(notification_types)
-        return f'''
+_NOTIFICATION_TYPES = [
+    ("info", "New user registered"),
+    ("success", "Backup completed successfully"),
+    ("warning", "High memory usage detected"),
+    ("error", "Failed login attempt")
+]
+
+# One pre-rendered fragment per notification type; only the time varies
+_NOTIFICATION_FMTS = [
+    f'''
         <div class="notification notification-{notif_type}" 
              style="animation: slideIn 0.3s ease-out;">
             <strong>{notif_type.upper()}:</strong> {message}
-            <span class="notification-time">{datetime.now().strftime('%H:%M:%S')}</span>
+            <span class="notification-time">{{ts}}</span>
         </div>
         '''
+    for notif_type, message in _NOTIFICATION_TYPES
+]
+
+
+@app.route('/api/notifications', methods=['GET'])
+def notifications():
+    """Get new notifications"""
+    # Randomly decide if there's a new notification
+    if random.random() > 0.5:
+        return random.choice(_NOTIFICATION_FMTS).format(ts=_hhmmss())
     
-    return '', 204
+    return _EMPTY_204
 
 
 # =============================================================================
@@ -345,7 +488,7 @@ def notifications():
 @app.route('/modal')
 def modal_page():
     """Modal dialogs demo"""
-    return render_template('modal.html')
+    return _static_page('modal.html')
 
 
 @app.route('/api/modal-content/<content_type>', methods=['GET'])
@@ -367,23 +510,22 @@ def modal_content(content_type):
         '''
     else:
         title = "Details"
-        body = f"Content for {content_type}"
+        body = f"Content for {escape(content_type)}"
     
-    return render_template('partials/modal_content.html', title=title, body=body)
+    return _tpl('partials/modal_content.html').render(title=title, body=body)
+
+
+_MODAL_SUBMIT_FMT = '<div class="alert alert-success">Thank you, {}!</div>'
 
 
 @app.route('/api/modal-submit', methods=['POST'])
 def modal_submit():
     """Submit modal form"""
     name = request.form.get('name', 'Guest')
-    return f'<div class="alert alert-success">Thank you, {name}!</div>'
+    return _MODAL_SUBMIT_FMT.format(escape(name))
 
 
-@app.route('/api/oob-demo', methods=['POST'])
-def oob_demo():
-    """Out-of-band swap demo"""
-    # This returns multiple updates in one response
-    return '''
+_OOB_DEMO_HTML = b'''
     <div id="main-content" class="alert alert-success">
         Main content updated!
     </div>
@@ -396,6 +538,13 @@ def oob_demo():
     '''
 
 
+@app.route('/api/oob-demo', methods=['POST'])
+def oob_demo():
+    """Out-of-band swap demo"""
+    # This returns multiple updates in one response
+    return _OOB_DEMO_HTML
+
+
 # =============================================================================
 # LOADING STATES AND CSS TRANSITIONS
 # =============================================================================
@@ -403,16 +552,10 @@ def oob_demo():
 @app.route('/transitions')
 def transitions_page():
     """CSS transitions and loading states demo"""
-    return render_template('transitions.html')
+    return _static_page('transitions.html')
 
 
-@app.route('/api/slow-load', methods=['GET'])
-def slow_load():
-    """Simulate slow loading for demonstration"""
-    duration = int(request.args.get('duration', 2))
-    time.sleep(duration)
-    
-    return '''
+_SLOW_LOAD_HTML = b'''
     <div class="card">
         <h3>Content Loaded!</h3>
         <p>This content took a while to load, but HTMX showed a nice loading indicator.</p>
@@ -420,6 +563,16 @@ def slow_load():
     '''
 
 
+@app.route('/api/slow-load', methods=['GET'])
+def slow_load():
+    """Simulate slow loading for demonstration"""
+    duration = int(request.args.get('duration', 2))
+    if _SIMULATE_LATENCY:
+        time.sleep(duration)
+    
+    return _SLOW_LOAD_HTML
+
+
 # =============================================================================
 # SERVER-SENT EVENTS (SSE)
 # =============================================================================
@@ -427,35 +580,37 @@ def slow_load():
 @app.route('/sse')
 def sse_page():
     """Server-Sent Events demo"""
-    return render_template('sse.html')
+    return _static_page('sse.html')
 
 
 @app.route('/api/sse-stream')
 def sse_stream():
     """Server-sent events stream"""
+    # Encode the whole batch up front so each tick only has to send a buffer
+    frames = [
+        b'data: ' + _json_bytes({
+            'count': i + 1,
+            'message': f'Update {i + 1}',
+            'value': random.randint(1, 100)
+        }) + b'\n\n'
+        for i in range(10)
+    ]
+    
     def generate():
-        import random
-        for i in range(10):
-            time.sleep(1)
-            data = {
-                'count': i + 1,
-                'message': f'Update {i + 1}',
-                'value': random.randint(1, 100)
-            }
-            yield f"data: {json.dumps(data)}\n\n"
+        # Flush the headers and an SSE comment straight away so the client
+        # (and any buffering proxy) sees the stream open before the first tick
+        yield b': connected\n\n'
+        start = time.monotonic()
+        for i, frame in enumerate(frames):
+            # Sleep until the next one-second deadline so ticks don't drift
+            time.sleep(max(0.0, start + i + 1 - time.monotonic()))
+            yield frame
     
-    return Response(generate(), mimetype='text/event-stream')
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
-@app.route('/api/sse-content', methods=['POST'])
-def sse_content():
-    """Handle SSE data and return HTML"""
-    data = request.get_json()
-    count = data.get('count', 0)
-    message = data.get('message', '')
-    value = data.get('value', 0)
-    
-    return f'''
+_SSE_ITEM_FMT = '''
     <div class="sse-item" style="animation: slideIn 0.3s ease-out;">
         <span class="badge badge-primary">#{count}</span>
         <strong>{message}</strong>
@@ -466,7 +621,21 @@ def sse_content():
     '''
 
 
+@app.route('/api/sse-content', methods=['POST'])
+def sse_content():
+    """Handle SSE data and return HTML"""
+    data = request.get_json()
+    count = escape(data.get('count', 0))
+    message = escape(data.get('message', ''))
+    value = escape(data.get('value', 0))
+    
+    return _SSE_ITEM_FMT.format(count=count, message=message, value=value)
+
+
 if __name__ == '__main__':
+    # The demo pages rely on the delays to show loading states
+    _SIMULATE_LATENCY = os.environ.get('SIMULATE_LATENCY', '1') == '1'
+    
     # SECURITY WARNING: Debug mode should only be used in development
-    # In production, use a WSGI server (gunicorn, uwsgi) without debug=True
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Enable it with FLASK_DEBUG=1; in production, serve wsgi.py with gunicorn
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -0,0 +1,7 @@
+"""
+WSGI entrypoint for production servers
+
+Usage:
+    gunicorn -w 4 --preload wsgi:application
+"""
+from app import app as application